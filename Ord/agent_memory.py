@@ -2,45 +2,620 @@
 
 import os
 import json
+import sqlite3
+import asyncio
+import threading
+import time
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime
+from chromadb.utils import embedding_functions
 from agentmemory import (
-    create_memory,
-    create_unique_memory,
-    get_memories,
-    search_memory,
     get_memory,
-    update_memory,
     delete_memory,
-    count_memories,
     wipe_category,
-    reset_epoch,
-    increment_epoch,
-    get_epoch,
-    create_event
+    create_event,
+    get_client
 )
 
+# Qdrant is optional; it is only needed when ORD_VECTOR_BACKEND=qdrant
+try:
+    from qdrant_client import QdrantClient, models as qdrant_models
+except ImportError:
+    QdrantClient = None
+    qdrant_models = None
+
 # Enable debugging
 os.environ["DEBUG"] = "True"
 
+# Event log entries are only written when something consumes them
+EVENTS_ENABLED = os.environ.get("ORD_EVENTS", "0") == "1"
+
 # Categories for Ord GPT's memory
 CATEGORY_CONVERSATIONS = "ord_conversations"
 CATEGORY_BITCOIN_FACTS = "bitcoin_facts"
 CATEGORY_ORDINALS_KNOWLEDGE = "ordinals_knowledge"
 CATEGORY_USER_PREFERENCES = "user_preferences"
 
+# Categories searched by meaning rather than by metadata
+SEMANTIC_CATEGORIES = (CATEGORY_BITCOIN_FACTS, CATEGORY_ORDINALS_KNOWLEDGE)
+
+# Vector store for the semantic categories: "chroma" (through agentmemory)
+# or "qdrant" (INT8 scalar-quantized collections)
+VECTOR_BACKEND = os.environ.get("ORD_VECTOR_BACKEND", "chroma").lower()
+_qdrant_client = None
+_collections_ready = False
+_collections_lock = threading.Lock()
+
+# Chroma collection handles, resolved once instead of looked up by name per call
+_COLLECTIONS = {}
+
+# HNSW index settings for the semantic collections. Chroma fixes search_ef
+# when a collection is created; Qdrant takes it per query, widened to four
+# times the number of requested results
+HNSW_M = 16
+HNSW_CONSTRUCTION_EF = 64
+HNSW_SEARCH_EF = 64
+
+# Relevance cut-off for semantic search: a result is kept only if it is
+# closer than (mean - std) of the distances between random stored pairs.
+# The cut-off needs a minimum sample, and is recomputed after new writes
+DISTANCE_SAMPLE_PAIRS = 1000
+DISTANCE_SAMPLE_VECTORS = 200
+DISTANCE_MIN_VECTORS = 20
+_distance_stats = {}
+_stale_distance_stats = set()
+
+# Instructions that stay identical across turns. They go first in the prompt,
+# ahead of the per-turn memory block, so the provider's prompt cache can
+# reuse them instead of being invalidated by retrieved memories
+CONTEXT_PREAMBLE = (
+    "You are Ord GPT. Each user turn is preceded by a memory block with the recent "
+    "conversation and any Bitcoin facts or Ordinals knowledge relevant to the message. "
+    "Treat the memory block as background, not as something the user said."
+)
+TOOL_PREAMBLE = (
+    "Knowledge is not prefetched. Call search_bitcoin_facts or search_ordinals_knowledge "
+    "when a question needs stored Bitcoin or Ordinals knowledge."
+)
+
+# Knowledge searches exposed as LLM tools for inject_mode="tool"
+MEMORY_TOOLS = [
+    {
+        "name": "search_bitcoin_facts",
+        "description": "Search Ord GPT's memory for Bitcoin facts relevant to a query.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What to look up"},
+                "limit": {"type": "integer", "description": "Maximum number of facts", "default": 3}
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "search_ordinals_knowledge",
+        "description": "Search Ord GPT's memory for Ordinals knowledge relevant to a query.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What to look up"},
+                "limit": {"type": "integer", "description": "Maximum number of items", "default": 3}
+            },
+            "required": ["query"]
+        }
+    }
+]
+
+# The memory system is initialized on first use instead of at import, so
+# one-off writers don't pay for the counts and seeding
+_INITIALIZED = False
+_init_lock = threading.Lock()
+
+# Each user has their own conversation epoch, kept with their rows in the
+# conversations index; it advances only after they have been quiet this long
+EPOCH_GAP_SEC = 15 * 60
+
+# user_id -> (current epoch, time of their last recorded message); only this
+# module's writes change it, so the index is read once per user per process
+_user_epochs = {}
+
+# Memory counts per category, kept current as this module writes
+_count_cache = {}
+
+# Fire-and-forget writes run on their own executor, which outlives the event
+# loop of the call that spawned them; asyncio.run would otherwise cancel them
+# at teardown and then wait for the thread anyway
+_background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ord-memory-bg")
+
+# SQLite index for conversation and preference lookups, which filter on
+# metadata only and don't need the vector store
+INDEX_PATH = os.environ.get(
+    "ORD_INDEX_PATH",
+    os.path.join(os.environ.get("STORAGE_PATH", "./memory"), "ord_index.sqlite3")
+)
+_index_conn = None
+_index_lock = threading.Lock()
+
+# Write-through cache of user preferences: user_id -> (version, preferences).
+# _pref_version counts writes per user, so a read that raced a write can tell
+# its result is stale
+_pref_cache = {}
+_pref_version = {}
+
+# Report a failed background write instead of dropping it
+def _log_background_error(future):
+    """Print the exception raised by a background call, if any"""
+    error = future.exception()
+    if error is not None:
+        print(f"Background memory write failed: {error!r}")
+
+# Run a blocking memory call on the background executor without waiting for it
+def _spawn_background(func, *args, **kwargs):
+    """Schedule a blocking call on the background executor and return its future"""
+    future = _background_executor.submit(func, *args, **kwargs)
+    future.add_done_callback(_log_background_error)
+    return future
+
+# Same embedding function agentmemory's Chroma collections use by default
+_embedding_function = embedding_functions.DefaultEmbeddingFunction()
+
+# Embed a normalized piece of text once and reuse the vector across turns
+@lru_cache(maxsize=4096)
+def _embed_cached(text_key):
+    """Return the embedding for a normalized text key as a tuple"""
+    return tuple(float(value) for value in _embedding_function([text_key])[0])
+
+# Embed a piece of text, sharing the cache between repeats of the same query
+def _embed(text):
+    """Return the embedding for a piece of text"""
+    # The MiniLM tokenizer is uncased and ignores surrounding whitespace,
+    # so normalizing the key doesn't change the vector
+    return list(_embed_cached(text.strip().lower()))
+
+# Embed several texts with a single call to the embedding model
+def _embed_batch(texts):
+    """Return embeddings for a list of texts"""
+    return [list(embedding) for embedding in _embedding_function(list(texts))]
+
+# Convert one query of a Chroma result into agentmemory-style dicts
+def _query_results_to_list(query, index=0):
+    """Convert the results for one query embedding into a list of memories"""
+    results = []
+    for i, memory_id in enumerate(query["ids"][index]):
+        result = {"id": memory_id}
+        for key, field in (("documents", "document"), ("metadatas", "metadata"),
+                           ("distances", "distance"), ("embeddings", "embedding")):
+            if query.get(key) is not None:
+                result[field] = query[key][index][i]
+        results.append(result)
+    return results
+
+# Convert a Qdrant point into an agentmemory-style dict
+def _point_to_memory(point):
+    """Convert a scored Qdrant point into a memory dict"""
+    metadata = dict(point.payload or {})
+    memory = {
+        "id": point.id,
+        "document": metadata.pop("document", None),
+        "metadata": metadata,
+        # Qdrant reports cosine similarity; memories carry a distance
+        "distance": 1.0 - point.score
+    }
+    if point.vector is not None:
+        memory["embedding"] = point.vector
+    return memory
+
+# Whether a category's vectors live in Qdrant rather than agentmemory
+def _uses_qdrant(category):
+    """Return True if the category is stored in the Qdrant backend"""
+    return VECTOR_BACKEND == "qdrant" and category in SEMANTIC_CATEGORIES
+
+# Create the semantic collections with their index settings
+def _init_collections():
+    """Create the HNSW-indexed semantic collections, returning the Qdrant client if used"""
+    global _qdrant_client, _collections_ready
+    with _collections_lock:
+        if _collections_ready:
+            return _qdrant_client
+        if VECTOR_BACKEND != "qdrant":
+            _init_chroma_collections()
+            _cache_collections()
+            _collections_ready = True
+            return None
+        if QdrantClient is None:
+            raise RuntimeError("ORD_VECTOR_BACKEND=qdrant requires the qdrant-client package")
+
+        if os.environ.get("QDRANT_URL"):
+            client = QdrantClient(url=os.environ["QDRANT_URL"],
+                                  api_key=os.environ.get("QDRANT_API_KEY"))
+        else:
+            client = QdrantClient(path=os.path.join(os.environ.get("STORAGE_PATH", "./memory"), "qdrant"))
+
+        dimension = len(_embed("dimension probe"))
+        for category in SEMANTIC_CATEGORIES:
+            if client.collection_exists(category):
+                continue
+            client.create_collection(
+                collection_name=category,
+                vectors_config=qdrant_models.VectorParams(
+                    size=dimension, distance=qdrant_models.Distance.COSINE),
+                hnsw_config=qdrant_models.HnswConfigDiff(
+                    m=HNSW_M, ef_construct=HNSW_CONSTRUCTION_EF),
+                quantization_config=qdrant_models.ScalarQuantization(
+                    scalar=qdrant_models.ScalarQuantizationConfig(
+                        type=qdrant_models.ScalarType.INT8,
+                        quantile=0.99,
+                        always_ram=True))
+            )
+        _qdrant_client = client
+        _cache_collections()
+        _collections_ready = True
+        return client
+
+# Resolve the Chroma collection handle for every category kept in Chroma
+def _cache_collections():
+    """Populate _COLLECTIONS for the categories stored in Chroma"""
+    client = get_client()
+    for category in (CATEGORY_CONVERSATIONS,) + SEMANTIC_CATEGORIES:
+        if not _uses_qdrant(category):
+            _COLLECTIONS[category] = client.get_or_create_collection(category)
+
+# Cached Chroma collection handle for a category
+def _collection(category):
+    """Return the Chroma collection for a category, resolving it on first use"""
+    memories = _COLLECTIONS.get(category)
+    if memories is None:
+        _init_collections()
+        memories = _COLLECTIONS.get(category)
+        if memories is None:
+            memories = _COLLECTIONS[category] = get_client().get_or_create_collection(category)
+    return memories
+
+# Thin wrappers over the cached Chroma collection handles
+def _add(category, documents, metadatas, embeddings=None):
+    """Upsert documents into a Chroma category"""
+    # ids are left to the collection so they follow agentmemory's scheme
+    _collection(category).upsert(ids=[None] * len(documents), documents=documents,
+                                 metadatas=metadatas, embeddings=embeddings)
+
+def _query(category, **kwargs):
+    """Query a Chroma category"""
+    return _collection(category).query(**kwargs)
+
+def _get(category, **kwargs):
+    """Get memories from a Chroma category"""
+    return _collection(category).get(**kwargs)
+
+# Create missing Chroma collections with cosine-space HNSW settings
+def _init_chroma_collections():
+    """Create the semantic Chroma collections with explicit HNSW parameters"""
+    chroma = getattr(get_client(), "chroma", None)
+    if chroma is None:
+        return
+
+    # Index settings only apply at creation, so existing collections are left alone
+    existing = {getattr(collection, "name", collection) for collection in chroma.list_collections()}
+    for category in SEMANTIC_CATEGORIES:
+        if category in existing:
+            continue
+        # Chroma can't change search_ef per query; hnswlib widens it to k when needed
+        chroma.create_collection(category, metadata={
+            "hnsw:space": "cosine",
+            "hnsw:M": HNSW_M,
+            "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+            "hnsw:search_ef": HNSW_SEARCH_EF
+        })
+
+# search_ef needed for a query returning n_results
+def _search_ef(n_results):
+    """Return the HNSW search breadth for a query of n_results"""
+    return max(HNSW_SEARCH_EF, n_results * 4)
+
+# Count the memories stored in a category
+def _count(category):
+    """Count memories in a category on whichever backend holds it (cached)"""
+    cached = _count_cache.get(category)
+    if cached is not None:
+        return cached
+
+    if _uses_qdrant(category):
+        count = _init_collections().count(category).count
+    else:
+        count = _collection(category).count()
+    _count_cache[category] = count
+    return count
+
+# Account for memories this module has just written
+def _bump_count(category, added=1):
+    """Update the cached count for a category after a write"""
+    if category in _count_cache:
+        _count_cache[category] += added
+    if category in SEMANTIC_CATEGORIES:
+        _stale_distance_stats.add(category)
+
+# Nearest neighbours for several query embeddings in one request
+def _query_vectors(category, query_embeddings, n_results, with_payload=True):
+    """Return one list of memories per query embedding"""
+    if _uses_qdrant(category):
+        # Search the INT8 vectors, then rescore the candidates at full precision
+        params = qdrant_models.SearchParams(
+            hnsw_ef=_search_ef(n_results),
+            quantization=qdrant_models.QuantizationSearchParams(rescore=True))
+        responses = _init_collections().query_batch_points(category, requests=[
+            qdrant_models.QueryRequest(query=embedding, limit=n_results,
+                                       params=params, with_payload=with_payload)
+            for embedding in query_embeddings
+        ])
+        return [[_point_to_memory(point) for point in response.points]
+                for response in responses]
+
+    count = _count(category)
+    if count == 0:
+        return [[] for _ in query_embeddings]
+
+    include = ["metadatas", "documents", "distances"] if with_payload else ["distances"]
+    query = _query(category, query_embeddings=query_embeddings,
+                   n_results=min(n_results, count), include=include)
+    return [_query_results_to_list(query, i) for i in range(len(query_embeddings))]
+
+# Insert documents with precomputed embeddings into a category
+def _add_memories(category, documents, embeddings, metadatas):
+    """Insert documents and their embeddings with a single write"""
+    # Same bookkeeping fields agentmemory's create_memory adds
+    now = datetime.now().timestamp()
+    metadatas = [dict(metadata, created_at=now, updated_at=now) for metadata in metadatas]
+
+    if _uses_qdrant(category):
+        _init_collections().upsert(category, points=[
+            qdrant_models.PointStruct(id=str(uuid.uuid4()), vector=embedding,
+                                      payload=dict(metadata, document=document))
+            for document, embedding, metadata in zip(documents, embeddings, metadatas)
+        ])
+    else:
+        _add(category, documents, metadatas, embeddings)
+    _bump_count(category, len(documents))
+
+# Search a category with a precomputed query embedding
+def search_memory_by_vector(category, query_embedding, n_results=5):
+    """Search a memory category using an existing embedding instead of text"""
+    return _query_vectors(category, [query_embedding], n_results)[0]
+
+# Fetch stored embeddings from a category, with the distance space they use
+def _sample_embeddings(category, limit):
+    """Return up to limit stored embeddings and the collection's distance space"""
+    if _uses_qdrant(category):
+        points, _ = _init_collections().scroll(category, limit=limit,
+                                               with_payload=False, with_vectors=True)
+        return [point.vector for point in points], "cosine"
+
+    collection = getattr(_collection(category), "collection", None)
+    metadata = (collection.metadata if collection is not None else None) or {}
+    embeddings = _get(category, limit=limit, include=["embeddings"])["embeddings"]
+    return embeddings or [], metadata.get("hnsw:space", "l2")
+
+# Estimate the typical distance between unrelated memories in each category
+def _compute_distance_stats(categories=SEMANTIC_CATEGORIES):
+    """Sample random pairs per semantic category and store mean/std distance"""
+    rng = np.random.default_rng()
+    for category in categories:
+        _stale_distance_stats.discard(category)
+        embeddings, space = _sample_embeddings(category, DISTANCE_SAMPLE_VECTORS)
+        if len(embeddings) < DISTANCE_MIN_VECTORS:
+            # Too few memories to say what "unusually close" means yet
+            _distance_stats.pop(category, None)
+            continue
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        first, second = rng.integers(0, len(vectors), size=(2, DISTANCE_SAMPLE_PAIRS))
+        distinct = first != second
+        a, b = vectors[first[distinct]], vectors[second[distinct]]
+
+        # Measure in the same space the collection reports distances in
+        if space == "l2":
+            distances = np.sum((a - b) ** 2, axis=1)
+        elif space == "ip":
+            distances = 1.0 - np.sum(a * b, axis=1)
+        else:
+            norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+            distances = 1.0 - np.sum(a * b, axis=1) / np.maximum(norms, 1e-12)
+
+        _distance_stats[category] = (float(distances.mean()), float(distances.std()))
+
+# Semantic search that only returns results closer than usual for the category
+def _search_relevant(category, query, limit, query_embedding):
+    """Search a category, dropping results that aren't significantly close"""
+    if query_embedding is None:
+        query_embedding = _embed(query)
+
+    # Results come back best first, with distances in the collection's own
+    # space (l2 for Chroma collections that predate the cosine settings);
+    # the cut-off is sampled in that same space
+    results = search_memory_by_vector(category, query_embedding, n_results=limit)
+
+    if category in _stale_distance_stats:
+        _compute_distance_stats((category,))
+    stats = _distance_stats.get(category)
+    if stats is None:
+        return results
+    mu, sigma = stats
+    return [result for result in results if result["distance"] < mu - sigma]
+
+# Batched equivalent of create_unique_memory for a list of documents
+def _create_unique_memories_batch(category, documents, metadata, similarity=0.85):
+    """Store the documents that aren't near-duplicates of existing memories"""
+    if not documents:
+        return []
+
+    embeddings = _embed_batch(documents)
+
+    # One query for the nearest neighbour of every document
+    max_distance = 1.0 - similarity
+    neighbours = _query_vectors(category, embeddings, 1, with_payload=False)
+    novel = [not nearest or nearest[0]["distance"] > max_distance
+             for nearest in neighbours]
+
+    documents = [doc for doc, keep in zip(documents, novel) if keep]
+    embeddings = [emb for emb, keep in zip(embeddings, novel) if keep]
+    if not documents:
+        return []
+
+    # Repeats within the batch aren't in the store yet, so compare the
+    # survivors with each other and keep the first of each near-duplicate group
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    kept = []
+    for i in range(len(vectors)):
+        if all(1.0 - float(vectors[i] @ vectors[j]) > max_distance for j in kept):
+            kept.append(i)
+    documents = [documents[i] for i in kept]
+    embeddings = [embeddings[i] for i in kept]
+
+    # Flag them the way create_unique_memory flags novel memories
+    metadatas = [dict(metadata, novel="True") for _ in documents]
+
+    # One insert for everything that survived
+    _add_memories(category, documents, embeddings, metadatas)
+    return documents
+
+# Open (and create if needed) the SQLite index
+def _get_index():
+    """Return the shared connection to the conversation/preference index"""
+    global _index_conn
+    with _index_lock:
+        if _index_conn is None:
+            index_dir = os.path.dirname(INDEX_PATH)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+            conn = sqlite3.connect(INDEX_PATH, check_same_thread=False)
+            # Tables, indexes and the backfill commit together, so an
+            # interrupted first run is redone from scratch next time
+            with conn:
+                created = not conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'conversations'").fetchone()
+                conn.execute("""CREATE TABLE IF NOT EXISTS conversations (
+                    user_id TEXT, ts REAL, speaker TEXT, doc TEXT, epoch INTEGER
+                )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_user_ts ON conversations(user_id, ts DESC)")
+                conn.execute("""CREATE TABLE IF NOT EXISTS preferences (
+                    user_id TEXT, pref_type TEXT, value TEXT, ts TEXT,
+                    PRIMARY KEY (user_id, pref_type)
+                )""")
+                if created:
+                    _backfill_index(conn)
+            _index_conn = conn
+        return _index_conn
+
+# Every memory stored in a category, for the one-time index backfill
+def _stored_memories(category):
+    """Return the ids, documents and metadata of all memories in a category"""
+    return _get(category, include=["metadatas", "documents"])
+
+# Stored metadata timestamp as seconds since the epoch
+def _memory_ts(metadata, field="created_at"):
+    """Return when a memory was written, from the given field or its ISO timestamp"""
+    if isinstance(metadata.get(field), (int, float)):
+        return float(metadata[field])
+    try:
+        return datetime.fromisoformat(metadata["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+# Copy conversations and preferences already stored in agentmemory into a new index
+def _backfill_index(conn):
+    """Import the existing conversation and preference memories, once"""
+    existing = {getattr(collection, "name", collection)
+                for collection in get_client().list_collections()}
+
+    if CATEGORY_CONVERSATIONS in existing:
+        stored = _stored_memories(CATEGORY_CONVERSATIONS)
+        rows = sorted(
+            (_memory_ts(metadata or {}), memory_id, metadata or {}, document)
+            for memory_id, metadata, document in zip(stored["ids"], stored["metadatas"], stored["documents"])
+        )
+        conn.executemany("INSERT INTO conversations VALUES (?, ?, ?, ?, ?)", [
+            (metadata.get("user_id"), ts, metadata.get("speaker"), document, metadata.get("epoch"))
+            for ts, _, metadata, document in rows
+        ])
+
+    if CATEGORY_USER_PREFERENCES in existing:
+        stored = _stored_memories(CATEGORY_USER_PREFERENCES)
+        # Oldest first, so the latest value of a preference wins
+        rows = sorted(zip(stored["metadatas"], stored["documents"]),
+                      key=lambda row: _memory_ts(row[0] or {}, "updated_at"))
+        conn.executemany("INSERT OR REPLACE INTO preferences VALUES (?, ?, ?, ?)", [
+            (metadata.get("user_id"), document, metadata.get("value"), metadata.get("timestamp"))
+            for metadata, document in rows if metadata
+        ])
+
+# Run a write against the SQLite index
+def _index_write(sql, params):
+    """Execute and commit a single statement on the index"""
+    conn = _get_index()
+    with _index_lock, conn:
+        conn.execute(sql, params)
+
+# Run a read against the SQLite index
+def _index_read(sql, params):
+    """Execute a query on the index and return all rows"""
+    conn = _get_index()
+    with _index_lock:
+        return conn.execute(sql, params).fetchall()
+
+# A user's epoch and last message time, read from the index on first use
+def _user_epoch_state(user_id):
+    """Return (epoch, last message timestamp) for a user; (0, 0) if unseen"""
+    state = _user_epochs.get(user_id)
+    if state is None:
+        rows = _index_read("SELECT epoch, ts FROM conversations WHERE user_id = ? "
+                           "ORDER BY ts DESC, rowid DESC LIMIT 1", (user_id,))
+        state = (rows[0][0] or 0, rows[0][1] or 0) if rows else (0, 0)
+        _user_epochs[user_id] = state
+    return state
+
+# The epoch a user's messages are currently recorded under
+def _current_epoch(user_id):
+    """Return the user's current conversation epoch"""
+    return _user_epoch_state(user_id)[0] or 1
+
+# Start a new epoch for a user if this message begins a new conversation
+def _start_turn(user_id, now):
+    """Return the user's epoch for a message, advancing it after a long gap"""
+    epoch, last = _user_epoch_state(user_id)
+    if epoch == 0 or now - last > EPOCH_GAP_SEC:
+        epoch += 1
+    _user_epochs[user_id] = (epoch, now)
+    return epoch
+
+# Public way for long-lived hosts to initialize up front instead of on first use
+def ensure_initialized():
+    """Initialize the memory system if this process hasn't yet"""
+    _ensure_init()
+
+# Run initialize_memory once, the first time the memory system is needed
+def _ensure_init():
+    """Initialize the memory system if this process hasn't yet"""
+    global _INITIALIZED
+    with _init_lock:
+        if _INITIALIZED:
+            return
+        initialize_memory()
+        _INITIALIZED = True
+
 # Initialize memory system
 def initialize_memory():
     """Initialize the memory system for Ord GPT"""
     print("Initializing Ord GPT memory system...")
-    # Reset the epoch counter
-    reset_epoch()
-    print(f"Memory system initialized. Current epoch: {get_epoch()}")
+    _init_collections()
+    print("Memory system initialized.")
     
     # Check if we have any existing memories
-    conversation_count = count_memories(CATEGORY_CONVERSATIONS)
-    facts_count = count_memories(CATEGORY_BITCOIN_FACTS)
-    ordinals_count = count_memories(CATEGORY_ORDINALS_KNOWLEDGE)
-    preferences_count = count_memories(CATEGORY_USER_PREFERENCES)
+    conversation_count = _count(CATEGORY_CONVERSATIONS)
+    facts_count = _count(CATEGORY_BITCOIN_FACTS)
+    ordinals_count = _count(CATEGORY_ORDINALS_KNOWLEDGE)
+    preferences_count = _index_read("SELECT COUNT(*) FROM preferences", ())[0][0]
     
     print(f"Found {conversation_count} conversation memories")
     print(f"Found {facts_count} Bitcoin fact memories")
@@ -50,10 +625,16 @@ def initialize_memory():
     # If no memories exist, seed with some initial knowledge
     if ordinals_count == 0:
         seed_initial_knowledge()
+    
+    # Calibrate the relevance cut-off used by the knowledge searches
+    _compute_distance_stats()
 
 # Seed the memory with initial Bitcoin and Ordinals knowledge
 def seed_initial_knowledge():
     """Seed the memory with initial Bitcoin and Ordinals knowledge"""
+    # Only the collections are needed here; a full _ensure_init() would
+    # seed an empty store itself before this call seeds it again
+    _init_collections()
     print("Seeding initial knowledge...")
     
     # Bitcoin facts
@@ -74,183 +655,326 @@ def seed_initial_knowledge():
         "Rare satoshis include those from the genesis block and block reward halving events."
     ]
     
+    # One timestamp for the whole seeding run
+    ts = datetime.now().isoformat()
+    metadata = {"timestamp": ts, "source": "initial_seeding"}
+    
+    # Embed everything in one model call, then write each category in one insert
+    embeddings = _embed_batch(bitcoin_facts + ordinals_knowledge)
+    split = len(bitcoin_facts)
+    
     # Store Bitcoin facts
-    for fact in bitcoin_facts:
-        create_memory(CATEGORY_BITCOIN_FACTS, fact, metadata={
-            "timestamp": datetime.now().isoformat(),
-            "source": "initial_seeding"
-        })
+    _add_memories(CATEGORY_BITCOIN_FACTS, bitcoin_facts, embeddings[:split],
+                  [metadata] * len(bitcoin_facts))
     
     # Store Ordinals knowledge
-    for knowledge in ordinals_knowledge:
-        create_memory(CATEGORY_ORDINALS_KNOWLEDGE, knowledge, metadata={
-            "timestamp": datetime.now().isoformat(),
-            "source": "initial_seeding"
-        })
+    _add_memories(CATEGORY_ORDINALS_KNOWLEDGE, ordinals_knowledge, embeddings[split:],
+                  [metadata] * len(ordinals_knowledge))
     
     print(f"Seeded {len(bitcoin_facts)} Bitcoin facts and {len(ordinals_knowledge)} Ordinals knowledge items")
 
 # Record a user message
-def record_user_message(user_id, message):
+def record_user_message(user_id, message, record_event=True, _ts=None):
     """Record a message from a user"""
-    create_memory(CATEGORY_CONVERSATIONS, message, metadata={
-        "timestamp": datetime.now().isoformat(),
+    epoch = _current_epoch(user_id)
+    timestamp = _ts or datetime.now().isoformat()
+    # generate_context has usually embedded this message already for retrieval
+    _add_memories(CATEGORY_CONVERSATIONS, [message], [_embed(message)], [{
+        "timestamp": timestamp,
         "user_id": user_id,
         "speaker": "user",
-        "epoch": get_epoch()
-    })
+        "epoch": epoch
+    }])
+    # The index orders by the same time the memory's metadata carries
+    ts = datetime.fromisoformat(timestamp).timestamp()
+    _index_write("INSERT INTO conversations VALUES (?, ?, ?, ?, ?)",
+                 (user_id, ts, "user", message, epoch))
+    _user_epochs[user_id] = (epoch, ts)
+    if record_event:
+        record_user_event(user_id, message)
+
+# Record the event log entry for a user message
+def record_user_event(user_id, message):
+    """Record an event for a message from a user"""
+    if not EVENTS_ENABLED:
+        return
     create_event(f"User {user_id} said: {message}", metadata={
         "user_id": user_id,
         "message_type": "user_message"
     })
 
 # Record Ord GPT's response
-def record_agent_response(user_id, message):
+def record_agent_response(user_id, message, _ts=None):
     """Record a response from Ord GPT"""
-    create_memory(CATEGORY_CONVERSATIONS, message, metadata={
-        "timestamp": datetime.now().isoformat(),
+    epoch = _current_epoch(user_id)
+    timestamp = _ts or datetime.now().isoformat()
+    # Responses are one-off text, so they bypass the query embedding cache
+    _add_memories(CATEGORY_CONVERSATIONS, [message], [_embed_batch([message])[0]], [{
+        "timestamp": timestamp,
         "user_id": user_id,
         "speaker": "ord_gpt",
-        "epoch": get_epoch()
-    })
-    create_event(f"Ord GPT responded to {user_id}: {message[:50]}...", metadata={
-        "user_id": user_id,
-        "message_type": "agent_response"
-    })
+        "epoch": epoch
+    }])
+    # The index orders by the same time the memory's metadata carries
+    ts = datetime.fromisoformat(timestamp).timestamp()
+    _index_write("INSERT INTO conversations VALUES (?, ?, ?, ?, ?)",
+                 (user_id, ts, "ord_gpt", message, epoch))
+    _user_epochs[user_id] = (epoch, ts)
+    if EVENTS_ENABLED:
+        create_event(f"Ord GPT responded to {user_id}: {message[:50]}...", metadata={
+            "user_id": user_id,
+            "message_type": "agent_response"
+        })
 
 # Record a new Bitcoin fact learned during conversation
-def record_bitcoin_fact(fact, source="conversation"):
+def record_bitcoin_fact(fact, source="conversation", _ts=None, user_id=None):
     """Record a new Bitcoin fact learned during conversation"""
-    create_unique_memory(CATEGORY_BITCOIN_FACTS, fact, metadata={
-        "timestamp": datetime.now().isoformat(),
-        "source": source,
-        "epoch": get_epoch()
-    }, similarity=0.85)
+    record_bitcoin_facts_batch([fact], source, _ts=_ts, user_id=user_id)
 
 # Record a new piece of Ordinals knowledge
-def record_ordinals_knowledge(knowledge, source="conversation"):
+def record_ordinals_knowledge(knowledge, source="conversation", _ts=None, user_id=None):
     """Record a new piece of Ordinals knowledge"""
-    create_unique_memory(CATEGORY_ORDINALS_KNOWLEDGE, knowledge, metadata={
-        "timestamp": datetime.now().isoformat(),
-        "source": source,
-        "epoch": get_epoch()
-    }, similarity=0.85)
+    record_ordinals_knowledge_batch([knowledge], source, _ts=_ts, user_id=user_id)
+
+# Metadata shared by knowledge learned in one batch
+def _knowledge_metadata(source, _ts, user_id):
+    """Return the metadata for new knowledge, tagged with the user's epoch if known"""
+    metadata = {
+        "timestamp": _ts or datetime.now().isoformat(),
+        "source": source
+    }
+    if user_id is not None:
+        metadata["user_id"] = user_id
+        metadata["epoch"] = _current_epoch(user_id)
+    return metadata
+
+# Record several new Bitcoin facts with one embed, one lookup and one insert
+def record_bitcoin_facts_batch(facts, source="conversation", _ts=None, user_id=None):
+    """Record new Bitcoin facts, skipping ones already known"""
+    return _create_unique_memories_batch(CATEGORY_BITCOIN_FACTS, facts,
+                                         _knowledge_metadata(source, _ts, user_id),
+                                         similarity=0.85)
+
+# Record several new pieces of Ordinals knowledge in one batch
+def record_ordinals_knowledge_batch(knowledge_items, source="conversation", _ts=None, user_id=None):
+    """Record new Ordinals knowledge, skipping items already known"""
+    return _create_unique_memories_batch(CATEGORY_ORDINALS_KNOWLEDGE, knowledge_items,
+                                         _knowledge_metadata(source, _ts, user_id),
+                                         similarity=0.85)
 
 # Record user preferences
-def record_user_preference(user_id, preference_type, preference_value):
+def record_user_preference(user_id, preference_type, preference_value, _ts=None):
     """Record a user preference"""
-    # Check if preference already exists
-    existing_prefs = search_memory(CATEGORY_USER_PREFERENCES, preference_type, 
-                                 filter_metadata={"user_id": user_id})
+    # (user_id, pref_type) is the primary key, so this creates or updates
+    _index_write("INSERT OR REPLACE INTO preferences VALUES (?, ?, ?, ?)",
+                 (user_id, preference_type, preference_value,
+                  _ts or datetime.now().isoformat()))
     
-    if existing_prefs:
-        # Update existing preference
-        update_memory(CATEGORY_USER_PREFERENCES, existing_prefs[0]["id"], 
-                     metadata={"value": preference_value, 
-                              "timestamp": datetime.now().isoformat()})
-    else:
-        # Create new preference
-        create_memory(CATEGORY_USER_PREFERENCES, preference_type, metadata={
-            "user_id": user_id,
-            "value": preference_value,
-            "timestamp": datetime.now().isoformat()
-        })
+    # Keep the cached preferences in step with what was just written
+    version = _pref_version.get(user_id, 0) + 1
+    _pref_version[user_id] = version
+    if user_id in _pref_cache:
+        preferences = _pref_cache[user_id][1]
+        preferences[preference_type] = preference_value
+        _pref_cache[user_id] = (version, preferences)
 
 # Get conversation history for a user
 def get_conversation_history(user_id, limit=10):
     """Get conversation history for a user"""
-    memories = get_memories(CATEGORY_CONVERSATIONS, 
-                          filter_metadata={"user_id": user_id},
-                          n_results=limit,
-                          sort_order="desc")
+    # Newest `limit` messages, returned by SQLite already in chronological order
+    rows = _index_read("SELECT speaker, doc FROM ("
+                       "SELECT speaker, doc, ts, rowid AS seq FROM conversations "
+                       "WHERE user_id = ? ORDER BY ts DESC, rowid DESC LIMIT ?"
+                       ") ORDER BY ts, seq", (user_id, limit))
     
     # Format into a readable conversation
-    conversation = []
-    for memory in reversed(memories):  # Reverse to get chronological order
-        speaker = memory["metadata"].get("speaker", "unknown")
-        text = memory["document"]
-        conversation.append({"speaker": speaker, "text": text})
-    
-    return conversation
+    return [{"speaker": speaker or "unknown", "text": text} for speaker, text in rows]
 
 # Search for relevant Bitcoin facts
-def search_bitcoin_facts(query, limit=5):
+def search_bitcoin_facts(query, limit=5, query_embedding=None):
     """Search for relevant Bitcoin facts"""
-    return search_memory(CATEGORY_BITCOIN_FACTS, query, n_results=limit)
+    return _search_relevant(CATEGORY_BITCOIN_FACTS, query, limit, query_embedding)
 
 # Search for relevant Ordinals knowledge
-def search_ordinals_knowledge(query, limit=5):
+def search_ordinals_knowledge(query, limit=5, query_embedding=None):
     """Search for relevant Ordinals knowledge"""
-    return search_memory(CATEGORY_ORDINALS_KNOWLEDGE, query, n_results=limit)
+    return _search_relevant(CATEGORY_ORDINALS_KNOWLEDGE, query, limit, query_embedding)
+
+# Async wrappers so independent retrievals can run concurrently
+async def get_conversation_history_async(user_id, limit=10):
+    """Get conversation history for a user without blocking the event loop"""
+    return await asyncio.to_thread(get_conversation_history, user_id, limit)
+
+async def search_bitcoin_facts_async(query, limit=5, query_embedding=None):
+    """Search for relevant Bitcoin facts without blocking the event loop"""
+    return await asyncio.to_thread(search_bitcoin_facts, query, limit, query_embedding)
+
+async def search_ordinals_knowledge_async(query, limit=5, query_embedding=None):
+    """Search for relevant Ordinals knowledge without blocking the event loop"""
+    return await asyncio.to_thread(search_ordinals_knowledge, query, limit, query_embedding)
+
+async def get_user_preferences_async(user_id):
+    """Get all preferences for a user without blocking the event loop"""
+    return await asyncio.to_thread(get_user_preferences, user_id)
+
+# Run one of the MEMORY_TOOLS on behalf of the LLM
+def run_memory_tool(name, arguments):
+    """Execute a memory tool call and return the matching documents"""
+    searches = {
+        "search_bitcoin_facts": search_bitcoin_facts,
+        "search_ordinals_knowledge": search_ordinals_knowledge
+    }
+    if name not in searches:
+        raise ValueError(f"Unknown memory tool: {name}")
+    if not isinstance(arguments, dict) or not isinstance(arguments.get("query"), str):
+        raise ValueError(f"Memory tool {name} requires a string 'query' argument")
+    _ensure_init()
+    results = searches[name](arguments["query"], limit=arguments.get("limit", 3))
+    return [result["document"] for result in results]
+
+# Render the part of the prompt that doesn't change between turns
+def _render_static_preamble(user_prefs, inject_mode):
+    """Build the cacheable system text: persona, layout and user profile"""
+    lines = [CONTEXT_PREAMBLE]
+    if inject_mode == "tool":
+        lines.append(TOOL_PREAMBLE)
+    if user_prefs:
+        # Sorted so the text is byte-identical whenever the preferences are
+        lines.append("User preferences:")
+        lines.extend(f"- {key}: {user_prefs[key]}" for key in sorted(user_prefs))
+    return "\n".join(lines)
+
+# Render the per-turn memory block
+def _render_dynamic_block(conversation_history, bitcoin_facts, ordinals_knowledge, epoch):
+    """Build the memory block that is sent with the current user turn"""
+    lines = [f"Conversation epoch: {epoch}"]
+    if conversation_history:
+        lines.append("Recent conversation:")
+        lines.extend(f"{turn['speaker']}: {turn['text']}" for turn in conversation_history)
+    if bitcoin_facts:
+        lines.append("Relevant Bitcoin facts:")
+        lines.extend(f"- {fact}" for fact in bitcoin_facts)
+    if ordinals_knowledge:
+        lines.append("Relevant Ordinals knowledge:")
+        lines.extend(f"- {knowledge}" for knowledge in ordinals_knowledge)
+    return "\n".join(lines)
 
 # Get user preferences
 def get_user_preferences(user_id):
     """Get all preferences for a user"""
-    memories = get_memories(CATEGORY_USER_PREFERENCES, 
-                          filter_metadata={"user_id": user_id},
-                          n_results=100)
+    version = _pref_version.get(user_id, 0)
+    cached = _pref_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return dict(cached[1])
+    
+    rows = _index_read("SELECT pref_type, value FROM preferences WHERE user_id = ?",
+                       (user_id,))
     
     preferences = {}
-    for memory in memories:
-        pref_type = memory["document"]
-        pref_value = memory["metadata"].get("value")
+    for pref_type, pref_value in rows:
         preferences[pref_type] = pref_value
     
-    return preferences
+    # Only cache the result if no preference was written while reading it
+    if _pref_version.get(user_id, 0) == version:
+        _pref_cache[user_id] = (version, preferences)
+    return dict(preferences)
 
 # Generate context for Ord GPT based on the current conversation
-def generate_context(user_id, current_message):
-    """Generate context for Ord GPT based on conversation and knowledge"""
-    # Start a new conversation epoch if this is a new conversation
-    increment_epoch()
-    
-    # Record the user message
-    record_user_message(user_id, current_message)
-    
-    # Get conversation history
-    conversation_history = get_conversation_history(user_id, limit=5)
-    
-    # Search for relevant knowledge based on the current message
-    bitcoin_facts = search_bitcoin_facts(current_message, limit=3)
-    ordinals_knowledge = search_ordinals_knowledge(current_message, limit=3)
-    
-    # Get user preferences
-    user_prefs = get_user_preferences(user_id)
-    
+async def generate_context(user_id, current_message, inject_mode="prefetch"):
+    """Generate context for Ord GPT based on conversation and knowledge
+
+    static_preamble holds only text that is stable across turns; put it in
+    the system prompt. dynamic_block changes every turn; send it as its own
+    uncached content block in the user message, ahead of the user's text:
+
+        system=[static_preamble]
+        messages=[{"role": "user", "content": [
+            {"type": "text", "text": dynamic_block}, user_message]}]
+
+    With inject_mode="tool" the knowledge searches are skipped and
+    context["tools"] lists them as tools instead (see run_memory_tool).
+    """
+    if inject_mode not in ("prefetch", "tool"):
+        raise ValueError(f"Unknown inject_mode: {inject_mode}")
+    await asyncio.to_thread(_ensure_init)
+
+    # Start a new epoch for this user if this is a new conversation
+    epoch = await asyncio.to_thread(_start_turn, user_id, time.time())
+
+    # Record the user message before reading history; its event log entry
+    # isn't needed for this turn, so that write happens in the background
+    await asyncio.to_thread(record_user_message, user_id, current_message, False)
+    if EVENTS_ENABLED:
+        _spawn_background(record_user_event, user_id, current_message)
+
+    if inject_mode == "tool":
+        # The model fetches knowledge itself, so only history and preferences are needed
+        conversation_history, user_prefs = await asyncio.gather(
+            get_conversation_history_async(user_id, limit=5),
+            get_user_preferences_async(user_id)
+        )
+        bitcoin_facts, ordinals_knowledge = [], []
+    else:
+        # Embed the message once and reuse the vector for both knowledge searches
+        query_embedding = await asyncio.to_thread(_embed, current_message)
+
+        # History, knowledge searches and preferences don't depend on each other,
+        # so fetch them concurrently instead of one round-trip at a time
+        conversation_history, bitcoin_facts, ordinals_knowledge, user_prefs = await asyncio.gather(
+            get_conversation_history_async(user_id, limit=5),
+            search_bitcoin_facts_async(current_message, 3, query_embedding),
+            search_ordinals_knowledge_async(current_message, 3, query_embedding),
+            get_user_preferences_async(user_id)
+        )
+
     # Compile all context
     context = {
         "conversation_history": conversation_history,
         "relevant_bitcoin_facts": [fact["document"] for fact in bitcoin_facts],
         "relevant_ordinals_knowledge": [knowledge["document"] for knowledge in ordinals_knowledge],
         "user_preferences": user_prefs,
-        "current_epoch": get_epoch()
+        "current_epoch": epoch
     }
     
+    # Prompt-ready split: a cacheable prefix and a per-turn block. The
+    # message was recorded before history was read, so it is dropped from the
+    # block; the caller sends it right after as the user's text
+    earlier_turns = conversation_history
+    if earlier_turns and earlier_turns[-1] == {"speaker": "user", "text": current_message}:
+        earlier_turns = earlier_turns[:-1]
+    context["static_preamble"] = _render_static_preamble(user_prefs, inject_mode)
+    context["dynamic_block"] = _render_dynamic_block(
+        earlier_turns,
+        context["relevant_bitcoin_facts"],
+        context["relevant_ordinals_knowledge"],
+        context["current_epoch"]
+    )
+    if inject_mode == "tool":
+        context["tools"] = MEMORY_TOOLS
+    
     return context
 
 # Main function to process a message and return a response with context
-def process_message(user_id, message):
+def process_message(user_id, message, inject_mode="prefetch"):
     """Process a message from a user and generate context for Ord GPT"""
-    context = generate_context(user_id, message)
+    context = asyncio.run(generate_context(user_id, message, inject_mode))
     return context
 
 # Function to record Ord GPT's response after generation
 def record_response(user_id, response, new_facts=None, new_knowledge=None):
     """Record Ord GPT's response and any new knowledge gained"""
+    # Share one timestamp across every write for this response
+    ts = datetime.now().isoformat()
+    
     # Record the agent's response
-    record_agent_response(user_id, response)
+    record_agent_response(user_id, response, _ts=ts)
     
-    # Record any new facts or knowledge
+    # Record any new facts or knowledge, one batch per category
     if new_facts:
-        for fact in new_facts:
-            record_bitcoin_fact(fact)
+        record_bitcoin_facts_batch(new_facts, _ts=ts, user_id=user_id)
     
     if new_knowledge:
-        for knowledge in new_knowledge:
-            record_ordinals_knowledge(knowledge)
-
-# Initialize the memory system when this module is imported
-initialize_memory()
+        record_ordinals_knowledge_batch(new_knowledge, _ts=ts, user_id=user_id)
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+# Long-lived worker that serves the Ord GPT memory system over stdin/stdout
+#
+# Each line on stdin is a JSON request such as
+#   {"id": 1, "op": "record_preference", "args": {"user_id": "...", ...}}
+# and each reply is written as one JSON line on stdout:
+#   {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": "..."}
+
+import sys
+import json
+import asyncio
+
+# stdout carries only protocol replies; anything the memory system prints
+# (initialization messages, agentmemory debug logs) goes to stderr instead
+_replies = sys.stdout
+sys.stdout = sys.stderr
+
+import agent_memory
+
+# One event loop (and its thread pool) for the life of the worker, instead of
+# the fresh loop process_message builds with asyncio.run on every call
+_loop = None
+
+# Process a user message and return the generated context
+def _process_message(user_id, message, inject_mode="prefetch"):
+    """Return the context for a user message"""
+    return _loop.run_until_complete(
+        agent_memory.generate_context(user_id, message, inject_mode))
+
+# Record Ord GPT's response and anything it learned
+def _record_response(user_id, response, new_facts=None, new_knowledge=None):
+    """Record a response with its new facts and knowledge"""
+    agent_memory.record_response(user_id, response, new_facts, new_knowledge)
+    return {"success": True}
+
+# Record a user preference
+def _record_preference(user_id, preference_type, preference_value):
+    """Record a single user preference"""
+    agent_memory.record_user_preference(user_id, preference_type, preference_value)
+    return {"success": True}
+
+# Run a memory tool call made by the model (inject_mode="tool")
+def _run_memory_tool(name, arguments):
+    """Return the documents a memory tool call asks for"""
+    return agent_memory.run_memory_tool(name, arguments)
+
+# Get a user's preferences
+def _get_preferences(user_id):
+    """Return all preferences for a user"""
+    return agent_memory.get_user_preferences(user_id)
+
+OPS = {
+    "process_message": _process_message,
+    "record_response": _record_response,
+    "record_preference": _record_preference,
+    "run_memory_tool": _run_memory_tool,
+    "get_preferences": _get_preferences
+}
+
+# Run one request and build its reply
+def handle_request(line):
+    """Dispatch a JSON request line and return the reply dict"""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get("id")
+        op = OPS.get(request.get("op"))
+        if op is None:
+            raise ValueError(f"Unknown op: {request.get('op')}")
+        return {"id": request_id, "ok": True, "result": op(**request.get("args", {}))}
+    except Exception as e:
+        return {"id": request_id, "ok": False, "error": str(e)}
+
+# Serve requests until stdin is closed
+def main():
+    """Initialize the memory system once, then answer requests line by line"""
+    global _loop
+    _loop = asyncio.new_event_loop()
+    agent_memory.ensure_initialized()
+    try:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            _replies.write(json.dumps(handle_request(line), default=str) + "\n")
+            _replies.flush()
+    finally:
+        _loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,8 @@
 
 import { spawn } from 'child_process';
 import path from 'path';
+import readline from 'readline';
 import { fileURLToPath } from 'url';
-import fs from 'fs';
 
 // Get the directory name for ES module
 const __filename = fileURLToPath(import.meta.url);
@@ -15,6 +15,10 @@ class OrdMemoryHandler {
     this.pythonPath = 'python3'; // Adjust if your Python executable is different
     this.scriptDir = path.join(__dirname);
     this.userId = 'default_user'; // Default user ID
+    this.worker = null; // Long-lived agent_memory_worker.py process
+    this.pending = new Map(); // Request id -> { resolve, reject }
+    this.nextId = 1;
+    this.stderr = '';
   }
 
   /**
@@ -26,75 +30,105 @@ class OrdMemoryHandler {
   }
 
   /**
-   * Run a Python script and return the result
-   * @param {string} scriptName - The name of the Python script to run
-   * @param {Array} args - Arguments to pass to the script
-   * @returns {Promise<any>} - The result of the script execution
+   * Start the Python memory worker if it isn't already running
+   * @returns {ChildProcess} - The worker process
    */
-  async runPythonScript(scriptName, args = []) {
+  startWorker() {
+    if (this.worker) {
+      return this.worker;
+    }
+
+    const workerPath = path.join(this.scriptDir, 'agent_memory_worker.py');
+    const worker = spawn(this.pythonPath, [workerPath], { cwd: this.scriptDir });
+
+    // Replies are one JSON object per line, matched to requests by id
+    readline.createInterface({ input: worker.stdout }).on('line', (line) => {
+      let reply;
+      try {
+        reply = JSON.parse(line);
+      } catch (error) {
+        console.warn(`Could not parse Python worker output: ${line}`);
+        return;
+      }
+      const pending = this.pending.get(reply.id);
+      if (!pending) {
+        return;
+      }
+      this.pending.delete(reply.id);
+      if (reply.ok) {
+        pending.resolve(reply.result);
+      } else {
+        pending.reject(new Error(reply.error));
+      }
+    });
+
+    worker.stderr.on('data', (data) => {
+      this.stderr = (this.stderr + data.toString()).slice(-4096);
+    });
+
+    const onExit = (error) => {
+      if (this.worker !== worker) {
+        return;
+      }
+      this.worker = null;
+      const reason = error || new Error(`Python worker exited: ${this.stderr}`);
+      for (const pending of this.pending.values()) {
+        pending.reject(reason);
+      }
+      this.pending.clear();
+    };
+    worker.on('error', onExit);
+    worker.on('close', () => onExit());
+    // Writing to a worker that has already exited fails with EPIPE here
+    worker.stdin.on('error', onExit);
+
+    this.worker = worker;
+    this.stderr = '';
+    return worker;
+  }
+
+  /**
+   * Send a request to the Python memory worker
+   * @param {string} op - The operation to run
+   * @param {object} args - Arguments for the operation
+   * @returns {Promise<any>} - The result of the operation
+   */
+  callWorker(op, args = {}) {
     return new Promise((resolve, reject) => {
-      const scriptPath = path.join(this.scriptDir, scriptName);
-      const process = spawn(this.pythonPath, [scriptPath, ...args]);
-      
-      let stdout = '';
-      let stderr = '';
-      
-      process.stdout.on('data', (data) => {
-        stdout += data.toString();
-      });
-      
-      process.stderr.on('data', (data) => {
-        stderr += data.toString();
-      });
-      
-      process.on('close', (code) => {
-        if (code !== 0) {
-          console.error(`Python script execution failed with code ${code}`);
-          console.error(`Error: ${stderr}`);
-          reject(new Error(`Script execution failed: ${stderr}`));
-        } else {
-          try {
-            const result = JSON.parse(stdout);
-            resolve(result);
-          } catch (error) {
-            console.warn('Could not parse Python output as JSON, returning raw output');
-            resolve(stdout);
-          }
-        }
-      });
+      const worker = this.startWorker();
+      if (this.worker !== worker) {
+        reject(new Error(`Python worker exited: ${this.stderr}`));
+        return;
+      }
+      const id = this.nextId++;
+      this.pending.set(id, { resolve, reject });
+      worker.stdin.write(JSON.stringify({ id, op, args }) + '\n');
     });
   }
 
+  /**
+   * Stop the Python memory worker
+   */
+  close() {
+    if (this.worker) {
+      this.worker.stdin.end();
+    }
+  }
+
   /**
    * Process a user message and get context for the agent
    * @param {string} message - The user's message
+   * @param {string} injectMode - 'prefetch' to include relevant knowledge, or 'tool' to
+   *   return it as tools for the model to call (see runMemoryTool)
    * @returns {Promise<object>} - Context object with conversation history and relevant knowledge
    */
-  async processMessage(message) {
+  async processMessage(message, injectMode = 'prefetch') {
     try {
-      // Create a temporary script to call the Python function
-      const tempScriptPath = path.join(this.scriptDir, 'temp_process_message.py');
-      
-      // Note: No indentation in the Python code
-      const scriptContent = `import sys
-import json
-from agent_memory import process_message
-
-user_id = "${this.userId}"
-message = "${message.replace(/"/g, '\\"')}"
-
-context = process_message(user_id, message)
-print(json.dumps(context))
-`;
-      
-      fs.writeFileSync(tempScriptPath, scriptContent);
-      
-      const result = await this.runPythonScript('temp_process_message.py');
-      
-      // Clean up the temporary script
-      fs.unlinkSync(tempScriptPath);
-      
-      return result;
+      return await this.callWorker('process_message', {
+        user_id: this.userId,
+        message,
+        inject_mode: injectMode
+      });
     } catch (error) {
       console.error('Error processing message:', error);
       // Return minimal context if there's an error
@@ -117,30 +151,12 @@ print(json.dumps(context))
    */
   async recordResponse(response, newFacts = [], newKnowledge = []) {
     try {
-      // Create a temporary script to call the Python function
-      const tempScriptPath = path.join(this.scriptDir, 'temp_record_response.py');
-      
-      // Note: No indentation in the Python code
-      const scriptContent = `import sys
-import json
-from agent_memory import record_response
-
-user_id = "${this.userId}"
-response = "${response.replace(/"/g, '\\"')}"
-new_facts = ${JSON.stringify(newFacts).replace(/"/g, '\\"')}
-new_knowledge = ${JSON.stringify(newKnowledge).replace(/"/g, '\\"')}
-
-record_response(user_id, response, new_facts, new_knowledge)
-print(json.dumps({"success": True}))
-`;
-      
-      fs.writeFileSync(tempScriptPath, scriptContent);
-      
-      await this.runPythonScript('temp_record_response.py');
-      
-      // Clean up the temporary script
-      fs.unlinkSync(tempScriptPath);
-      
+      await this.callWorker('record_response', {
+        user_id: this.userId,
+        response,
+        new_facts: newFacts || [],
+        new_knowledge: newKnowledge || []
+      });
       return true;
     } catch (error) {
       console.error('Error recording response:', error);
@@ -156,29 +172,11 @@ print(json.dumps({"success": True}))
    */
   async recordUserPreference(preferenceType, preferenceValue) {
     try {
-      // Create a temporary script to call the Python function
-      const tempScriptPath = path.join(this.scriptDir, 'temp_record_preference.py');
-      
-      // Note: No indentation in the Python code
-      const scriptContent = `import sys
-import json
-from agent_memory import record_user_preference
-
-user_id = "${this.userId}"
-preference_type = "${preferenceType.replace(/"/g, '\\"')}"
-preference_value = "${preferenceValue.toString().replace(/"/g, '\\"')}"
-
-record_user_preference(user_id, preference_type, preference_value)
-print(json.dumps({"success": True}))
-`;
-      
-      fs.writeFileSync(tempScriptPath, scriptContent);
-      
-      await this.runPythonScript('temp_record_preference.py');
-      
-      // Clean up the temporary script
-      fs.unlinkSync(tempScriptPath);
-      
+      await this.callWorker('record_preference', {
+        user_id: this.userId,
+        preference_type: preferenceType,
+        preference_value: preferenceValue.toString()
+      });
       return true;
     } catch (error) {
       console.error('Error recording user preference:', error);
@@ -186,33 +184,28 @@ print(json.dumps({"success": True}))
     }
   }
 
+  /**
+   * Run a memory tool call made by the model when using the 'tool' inject mode
+   * @param {string} name - The tool name from context.tools
+   * @param {object} args - The tool call's input, e.g. { query, limit }
+   * @returns {Promise<Array>} - Matching documents
+   */
+  async runMemoryTool(name, args) {
+    try {
+      return await this.callWorker('run_memory_tool', { name, arguments: args });
+    } catch (error) {
+      console.error('Error running memory tool:', error);
+      return [];
+    }
+  }
+
   /**
    * Get all user preferences
    * @returns {Promise<object>} - Object containing user preferences
    */
   async getUserPreferences() {
     try {
-      // Create a temporary script to call the Python function
-      const tempScriptPath = path.join(this.scriptDir, 'temp_get_preferences.py');
-      
-      // Note: No indentation in the Python code
-      const scriptContent = `import sys
-import json
-from agent_memory import get_user_preferences
-
-user_id = "${this.userId}"
-preferences = get_user_preferences(user_id)
-print(json.dumps(preferences))
-`;
-      
-      fs.writeFileSync(tempScriptPath, scriptContent);
-      
-      const result = await this.runPythonScript('temp_get_preferences.py');
-      
-      // Clean up the temporary script
-      fs.unlinkSync(tempScriptPath);
-      
-      return result;
+      return await this.callWorker('get_preferences', { user_id: this.userId });
     } catch (error) {
       console.error('Error getting user preferences:', error);
       return {};
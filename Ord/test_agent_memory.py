@@ -0,0 +1,95 @@
+# Tests for the SQLite index behind conversation history and user preferences
+
+import pytest
+
+import agent_memory
+
+
+class _FakeClient:
+    """Stands in for the agentmemory client during the index backfill"""
+
+    def __init__(self, names):
+        self.names = names
+
+    def list_collections(self):
+        return self.names
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """Point the module at a fresh index file with no stored memories"""
+    monkeypatch.setattr(agent_memory, "INDEX_PATH", str(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(agent_memory, "_index_conn", None)
+    monkeypatch.setattr(agent_memory, "get_client", lambda: _FakeClient([]))
+    agent_memory._pref_cache.clear()
+    agent_memory._pref_version.clear()
+    yield
+    if agent_memory._index_conn is not None:
+        agent_memory._index_conn.close()
+
+
+def test_preferences_replace_previous_value(index):
+    agent_memory.record_user_preference("u1", "favorite_topic", "rare_satoshis")
+    agent_memory.record_user_preference("u1", "favorite_topic", "inscriptions")
+    agent_memory.record_user_preference("u1", "preferred_network", "mainnet")
+    agent_memory.record_user_preference("u2", "favorite_topic", "runes")
+
+    assert agent_memory.get_user_preferences("u1") == {
+        "favorite_topic": "inscriptions",
+        "preferred_network": "mainnet",
+    }
+    rows = agent_memory._index_read(
+        "SELECT COUNT(*) FROM preferences WHERE user_id = ?", ("u1",))
+    assert rows[0][0] == 2
+
+
+def test_history_returns_newest_messages_oldest_first(index):
+    for ts, speaker, doc in [(1.0, "user", "first"), (2.0, "ord_gpt", "second"),
+                             (3.0, "user", "third"), (3.0, "ord_gpt", "fourth")]:
+        agent_memory._index_write("INSERT INTO conversations VALUES (?, ?, ?, ?, ?)",
+                                  ("u1", ts, speaker, doc, 1))
+    agent_memory._index_write("INSERT INTO conversations VALUES (?, ?, ?, ?, ?)",
+                              ("u2", 4.0, "user", "other user", 1))
+
+    assert agent_memory.get_conversation_history("u1", limit=3) == [
+        {"speaker": "ord_gpt", "text": "second"},
+        {"speaker": "user", "text": "third"},
+        {"speaker": "ord_gpt", "text": "fourth"},
+    ]
+
+
+def test_new_index_backfills_existing_memories(index, monkeypatch):
+    stored = {
+        agent_memory.CATEGORY_CONVERSATIONS: {
+            "ids": ["0000000000000001", "0000000000000000"],
+            "documents": ["hi there", "hello"],
+            "metadatas": [
+                {"user_id": "u1", "speaker": "ord_gpt", "epoch": 3, "created_at": 20.0},
+                {"user_id": "u1", "speaker": "user", "epoch": 3, "created_at": 10.0},
+            ],
+        },
+        agent_memory.CATEGORY_USER_PREFERENCES: {
+            "ids": ["0000000000000000", "0000000000000001"],
+            "documents": ["favorite_topic", "favorite_topic"],
+            "metadatas": [
+                {"user_id": "u1", "value": "inscriptions", "updated_at": 30.0,
+                 "timestamp": "2024-01-02T00:00:00"},
+                {"user_id": "u1", "value": "rare_satoshis", "updated_at": 20.0,
+                 "timestamp": "2024-01-01T00:00:00"},
+            ],
+        },
+    }
+    monkeypatch.setattr(agent_memory, "get_client", lambda: _FakeClient(list(stored)))
+    monkeypatch.setattr(agent_memory, "_stored_memories", lambda category: stored[category])
+
+    assert agent_memory.get_conversation_history("u1") == [
+        {"speaker": "user", "text": "hello"},
+        {"speaker": "ord_gpt", "text": "hi there"},
+    ]
+    assert agent_memory.get_user_preferences("u1") == {"favorite_topic": "inscriptions"}
+
+    # Reopening an existing index doesn't import the memories a second time
+    agent_memory._index_conn.close()
+    monkeypatch.setattr(agent_memory, "_index_conn", None)
+    rows = agent_memory._index_read("SELECT COUNT(*) FROM conversations", ())
+    assert rows[0][0] == 2
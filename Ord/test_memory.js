@@ -3,10 +3,11 @@
 async function testMemorySystem() {
   console.log('Testing Ord GPT Memory System...');
   
+  let ordMemory;
   try {
     // Dynamically import the memory handler
     const ordMemoryModule = await import('./ord_memory_handler.js');
-    const ordMemory = ordMemoryModule.default;
+    ordMemory = ordMemoryModule.default;
     
     // Set a test user ID
     const userId = 'test_user_' + Date.now();
@@ -54,6 +55,11 @@ async function testMemorySystem() {
     console.log('\nMemory system test completed successfully!');
   } catch (error) {
     console.error('Error during memory system test:', error);
+  } finally {
+    // Stop the Python worker so Node can exit
+    if (ordMemory) {
+      ordMemory.close();
+    }
   }
 }
 